@@ -1,22 +1,35 @@
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, Query
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, Query, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
+import asyncio
 import json
+import orjson
+import sqlite3
+import threading
+from collections import Counter
+from itertools import islice
 import os
-import uuid
+import time
+import secrets
+import shutil
 from datetime import datetime
-import aiofiles
 import mimetypes
 import re
-from elasticsearch import Elasticsearch, AsyncElasticsearch
-import base64
+from elasticsearch import AsyncElasticsearch, helpers
+from elasticsearch.serializer import OrjsonSerializer
+try:
+    # SIMD 가속 base64 (설치되어 있지 않으면 표준 라이브러리 사용)
+    import pybase64 as base64
+except ImportError:
+    import base64
 from html import unescape
 import zipfile
 import tempfile
-import shutil
+from concurrent.futures import ThreadPoolExecutor
 
 app = FastAPI(
     title="LIPOLAB Posts API",
@@ -32,10 +45,35 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-POSTS_DIR = "data/posts"
+POSTS_DIR = "data/posts"  # 예전 파일 저장소 (최초 실행 시 POSTS_DB로 가져옴)
+POSTS_DB = "data/posts.db"
 UPLOADS_DIR = "data/uploads"
 IMAGES_DIR = "data/images"
 ES_HOST = "http://localhost:9200"
+ES_PING_TTL = 30  # ES 연결 상태를 다시 확인하기까지의 시간 (초)
+ES_PING_TIMEOUT = 2  # ES ping 요청 타임아웃 (초)
+VIEWS_FLUSH_INTERVAL = 5  # 조회수 디스크 반영 주기 (초)
+POSTS_CHECK_INTERVAL = 1  # 다른 프로세스의 게시물 DB 변경 여부를 확인하는 최소 간격 (초)
+ES_INDEX_WORKERS = 4
+ES_BULK_CHUNK_SIZE = 500
+ES_BULK_MAX_BYTES = 10 * 1024 * 1024
+ES_INDEX_FLUSH_INTERVAL = 1  # 색인 대기열을 모아서 보내기 전 대기 시간 (초)
+ES_MAX_RESULT_WINDOW = 10000  # ES index.max_result_window 기본값 (search size 상한)
+# 새 게시물이 검색에 보이기까지의 지연 상한. 기본값(1s)보다 refresh 횟수를 줄이되 30s처럼 길게 잡지는 않음
+ES_REFRESH_INTERVAL = "5s"
+ES_SETTINGS_RETRY_INTERVAL = 5  # refresh_interval 복구 실패 시 재시도 간격 (초)
+UPLOAD_CHUNK_SIZE = 1 << 20  # 업로드 파일을 디스크에 쓸 때 한 번에 읽는 크기
+MAX_CONCURRENT_UPLOAD_WRITES = 8  # 동시에 디스크에 쓰는 업로드 파일 수 상한
+ZIP_SPOOL_MAX_SIZE = 32 * 1024 * 1024  # 이보다 큰 ZIP export는 메모리 대신 임시 파일에 생성
+ZIP_STREAM_CHUNK_SIZE = 1 << 20
+EXPORT_READ_WORKERS = 8  # export에서 첨부/이미지 파일을 동시에 읽는 스레드 수
+LARGE_CONTENT_SIZE = 1 << 20  # 이보다 긴 본문은 응답 모델 생성을 스레드에서 처리
+ALLOWED_IMAGE_TYPES = frozenset({"image/jpeg", "image/jpg", "image/png", "image/gif", "image/webp", "image/bmp"})
+# 이미 압축된 형식은 ZIP export에서 다시 압축하지 않고 그대로 저장
+ZIP_STORED_EXTENSIONS = frozenset({
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".zip", ".gz", ".7z",
+    ".pdf", ".docx", ".xlsx", ".pptx", ".hwpx", ".mp4", ".mp3",
+})
 
 os.makedirs(POSTS_DIR, exist_ok=True)
 os.makedirs(UPLOADS_DIR, exist_ok=True)
@@ -43,7 +81,47 @@ os.makedirs(IMAGES_DIR, exist_ok=True)
 
 app.mount("/static/images", StaticFiles(directory=IMAGES_DIR), name="images")
 
-es_client = None
+# ES 클라이언트와 마지막 ping 결과 (ES_PING_TTL 동안 재사용)
+_ES_STATE = {"client": None, "ok": False, "checked_at": 0.0}
+
+# 게시물 인메모리 캐시: startup 시 1회 로드하고 생성/수정 시 갱신
+POSTS_CACHE: Dict[str, dict] = {}
+# postDate 내림차순으로 정렬된 게시물 목록 (POSTS_CACHE와 같은 dict 객체를 공유)
+POSTS_SORTED: List[dict] = []
+# 게시물 생성/수정/조회수 변경 시마다 증가 (/api/posts의 ETag로 사용)
+POSTS_VERSION = 0
+# 재시작 후 이전 프로세스의 ETag와 겹치지 않도록 붙이는 값
+POSTS_ETAG_PREFIX = secrets.token_hex(4)
+# ES 미사용 시 검색용: 게시물 ID -> (소문자 제목, 소문자 본문)
+POSTS_LC: Dict[str, Tuple[str, str]] = {}
+# export용: 게시물 ID -> 태그를 제거한 본문 (DB content_text 컬럼에 저장해 둔 값)
+POSTS_TEXT: Dict[str, str] = {}
+# 캐시/DB 쓰기 직렬화용
+POSTS_LOCK = asyncio.Lock()
+# 게시물 저장소 (startup에서 연결). 여러 스레드에서 쓰므로 POSTS_DB_LOCK으로 보호
+posts_db: Optional[sqlite3.Connection] = None
+POSTS_DB_LOCK = threading.Lock()
+# 캐시를 로드한 시점의 DB data_version/posts_version과 마지막으로 변경 여부를 확인한 시각
+# (data_version은 조회수만 바뀌어도 바뀌므로, 게시물 내용 변경은 posts_meta의 posts_version으로 구분)
+posts_db_version = None
+posts_content_version = None
+posts_checked_at = 0.0
+# 아직 디스크에 반영되지 않은 게시물별 조회수 증가분
+VIEWS_DELTA: Counter = Counter()
+views_flush_task = None
+# 요청 경로 밖에서 bulk로 색인할 게시물 대기열
+ES_INDEX_QUEUE: asyncio.Queue = asyncio.Queue()
+es_index_tasks: List[asyncio.Task] = []
+reindex_task: Optional[asyncio.Task] = None
+# 업로드 파일 쓰기 동시 실행 수 제한 (파일 핸들/디스크 대역폭 보호)
+IO_SEM = asyncio.Semaphore(MAX_CONCURRENT_UPLOAD_WRITES)
+# 디렉토리별 파일 ID(확장자를 뺀 파일명) -> 저장된 파일명
+FILE_INDEX: Dict[str, Dict[str, str]] = {UPLOADS_DIR: {}, IMAGES_DIR: {}}
+# 첨부파일 ID -> {"post_id", "saved_filename", "original_filename"}
+ATTACHMENT_INDEX: Dict[str, dict] = {}
+
+# clean_filename에서 제거할 문자 (영문, 숫자, '.', '_', '-' 이외)
+_FILENAME_RE = re.compile(r'[^a-zA-Z0-9._-]')
 
 def clean_filename(filename: str) -> str:
     """
@@ -56,7 +134,7 @@ def clean_filename(filename: str) -> str:
     name, ext = os.path.splitext(filename)
     
     # 한글 및 특수문자 제거, 영문과 숫자만 유지
-    clean_name = re.sub(r'[^a-zA-Z0-9._-]', '', name)
+    clean_name = _FILENAME_RE.sub('', name)
     
     # 빈 문자열이면 기본값 사용
     if not clean_name:
@@ -68,6 +146,16 @@ def clean_filename(filename: str) -> str:
     
     return clean_name + ext
 
+# 첨부파일 크기를 B/KB/MB/GB 단위 표시 문자열로 변환 (소수점 이하는 버림)
+def format_size(size: int) -> str:
+    if size < 1 << 10:
+        return f"{size}B"
+    if size < 1 << 20:
+        return f"{size >> 10}KB"
+    if size < 1 << 30:
+        return f"{size >> 20}MB"
+    return f"{size >> 30}GB"
+
 class Attachment(BaseModel):
     id: str
     name: str
@@ -104,28 +192,50 @@ class PostResponse(BaseModel):
     attachments: List[Attachment]
     uploaded_images: Optional[List[UploadedImage]] = []
 
-def get_es_client():
-    global es_client
-    if es_client is None:
-        try:
-            es_client = Elasticsearch([ES_HOST])
-            if not es_client.ping():
-                print("Elasticsearch connection failed")
-                es_client = None
-        except Exception as e:
-            print(f"Elasticsearch error: {e}")
-            es_client = None
-    return es_client
+async def get_es_client():
+    """
+    사용 가능한 ES 클라이언트를 반환하고, 연결할 수 없으면 None을 반환
+    """
+    now = time.monotonic()
+    if _ES_STATE["checked_at"] and now - _ES_STATE["checked_at"] < ES_PING_TTL:
+        return _ES_STATE["client"] if _ES_STATE["ok"] else None
+    # 동시에 들어온 요청들이 각자 ping하지 않도록 확인 시각을 먼저 갱신
+    _ES_STATE["checked_at"] = now
+
+    try:
+        if _ES_STATE["client"] is None:
+            _ES_STATE["client"] = AsyncElasticsearch([ES_HOST], serializer=OrjsonSerializer())
+        ok = await _ES_STATE["client"].options(request_timeout=ES_PING_TIMEOUT).ping()
+        if not ok:
+            print("Elasticsearch connection failed")
+    except Exception as e:
+        print(f"Elasticsearch error: {e}")
+        ok = False
+    _ES_STATE["ok"] = ok
+    return _ES_STATE["client"] if ok else None
 
 @app.on_event("startup")
 async def startup_event():
-    es = get_es_client()
+    global views_flush_task
+    init_posts_db()
+    load_posts_cache()
+    load_file_indexes()
+    views_flush_task = asyncio.create_task(views_flush_loop())
+    es_index_tasks.extend(asyncio.create_task(es_index_worker()) for _ in range(ES_INDEX_WORKERS))
+    es = await get_es_client()
     if es:
         try:
-            if not es.indices.exists(index="posts"):
-                es.indices.create(
+            if not await es.indices.exists(index="posts"):
+                await es.indices.create(
                     index="posts",
                     body={
+                        "settings": {
+                            "number_of_shards": 1,
+                            "number_of_replicas": 0,
+                            "refresh_interval": ES_REFRESH_INTERVAL,
+                            # 원본은 게시물 DB에 있으므로 ES 장애 시 최근 색인 일부 유실은 reindex_all로 복구
+                            "translog": {"durability": "async", "sync_interval": "30s", "flush_threshold_size": "1gb"}
+                        },
                         "mappings": {
                             "properties": {
                                 "title": {"type": "text", "analyzer": "standard"},
@@ -141,49 +251,393 @@ async def startup_event():
                         }
                     }
                 )
+                # 새로 만든 인덱스에는 기존 게시물이 없으므로 전체 색인
+                await reindex_all()
+            else:
+                # 이전 프로세스가 reindex 중에 끝나 refresh_interval이 -1로 남아 있을 수 있으므로 다시 적용
+                await es.indices.put_settings(index="posts", settings={"index": {"refresh_interval": ES_REFRESH_INTERVAL}})
         except Exception as e:
             print(f"Elasticsearch index creation error: {e}")
 
-def save_post_to_file(post_id: str, post_data: dict):
-    file_path = os.path.join(POSTS_DIR, f"{post_id}.json")
-    with open(file_path, 'w', encoding='utf-8') as f:
-        json.dump(post_data, f, ensure_ascii=False, indent=2)
+@app.on_event("shutdown")
+async def shutdown_event():
+    if views_flush_task:
+        # flush_views는 DB 쓰기 동안 POSTS_LOCK을 잡고 있음. 쓰기 도중에 취소하면 커밋된 증가분이
+        # VIEWS_DELTA에 남아 아래에서 한 번 더 저장되므로, 쓰기가 끝난 뒤 취소하고 종료를 기다림
+        async with POSTS_LOCK:
+            views_flush_task.cancel()
+        try:
+            await views_flush_task
+        except asyncio.CancelledError:
+            pass
+    await flush_views()
+
+    if reindex_task and not reindex_task.done():
+        reindex_task.cancel()
+        try:
+            await reindex_task
+        except asyncio.CancelledError:
+            pass
+
+    # 취소하면 워커가 이미 꺼내 모으던 게시물이 색인되지 않으므로, 워커마다 종료 표시(None)를 넣고
+    # 대기열에 남은 것까지 모두 보낸 뒤 끝나기를 기다림
+    for _ in es_index_tasks:
+        ES_INDEX_QUEUE.put_nowait(None)
+    await asyncio.gather(*es_index_tasks, return_exceptions=True)
+
+    if _ES_STATE["client"]:
+        await _ES_STATE["client"].close()
+
+    if posts_db:
+        posts_db.close()
+
+def init_posts_db():
+    global posts_db
+    posts_db = sqlite3.connect(POSTS_DB, check_same_thread=False)
+    # WAL: 다른 워커 프로세스가 쓰는 동안에도 읽기가 막히지 않고, 커밋마다 fsync하지 않음
+    posts_db.execute("PRAGMA journal_mode=WAL")
+    posts_db.execute("PRAGMA synchronous=NORMAL")
+    # views는 조회 때마다 게시물 전체를 다시 쓰지 않도록 별도 컬럼에 저장 (json 안의 views보다 우선)
+    posts_db.execute(
+        "CREATE TABLE IF NOT EXISTS posts ("
+        "id TEXT PRIMARY KEY, post_date TEXT NOT NULL, json BLOB NOT NULL, views INTEGER NOT NULL DEFAULT 0, "
+        "content_text TEXT)"
+    )
+    posts_db.execute("CREATE INDEX IF NOT EXISTS idx_posts_post_date ON posts (post_date DESC)")
+    posts_db.execute("CREATE TABLE IF NOT EXISTS posts_meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+    posts_db.execute("INSERT OR IGNORE INTO posts_meta (name, value) VALUES ('posts_version', 0)")
+    # 게시물 내용이 바뀌면(다른 프로세스/연결의 쓰기 포함) posts_version 증가. 조회수만 바뀐 경우와 구분하기 위함
+    for name, event in (
+        ("insert", "INSERT"),
+        ("update", "UPDATE OF id, post_date, json, content_text"),
+        ("delete", "DELETE"),
+    ):
+        posts_db.execute(
+            f"CREATE TRIGGER IF NOT EXISTS posts_version_{name} AFTER {event} ON posts BEGIN "
+            "UPDATE posts_meta SET value = value + 1 WHERE name = 'posts_version'; END"
+        )
+    columns = [row[1] for row in posts_db.execute("PRAGMA table_info(posts)")]
+    if "views" not in columns:
+        # views 컬럼이 없던 DB는 json에 저장된 조회수로 채움
+        posts_db.execute("ALTER TABLE posts ADD COLUMN views INTEGER NOT NULL DEFAULT 0")
+        rows = posts_db.execute("SELECT id, json FROM posts").fetchall()
+        posts_db.executemany(
+            "UPDATE posts SET views = ? WHERE id = ?",
+            [(orjson.loads(data).get("views", 0), post_id) for post_id, data in rows]
+        )
+    if "content_text" not in columns:
+        posts_db.execute("ALTER TABLE posts ADD COLUMN content_text TEXT")
+    posts_db.commit()
+    if posts_db.execute("SELECT 1 FROM posts LIMIT 1").fetchone() is None:
+        import_post_files()
+    fill_content_text()
+
+def fill_content_text():
+    """
+    content_text가 아직 없는 게시물(기존/가져온 게시물)의 태그 제거 본문을 한 번만 계산해 저장
+    """
+    with POSTS_DB_LOCK:
+        rows = posts_db.execute("SELECT id, json FROM posts WHERE content_text IS NULL").fetchall()
+        if not rows:
+            return
+        posts_db.executemany(
+            "UPDATE posts SET content_text = ? WHERE id = ?",
+            [(strip_html_tags(orjson.loads(data).get("content") or ""), post_id) for post_id, data in rows]
+        )
+        posts_db.commit()
+
+def import_post_files():
+    """
+    POSTS_DIR에 게시물별 JSON 파일로 저장된 기존 게시물을 DB로 가져옴
+    """
+    rows = []
+    with os.scandir(POSTS_DIR) as it:
+        for entry in it:
+            if entry.name.endswith('.json') and entry.is_file():
+                try:
+                    with open(entry.path, 'rb') as f:
+                        post = orjson.loads(f.read())
+                except Exception as e:
+                    print(f"Error importing post {entry.name}: {e}")
+                    continue
+                post.setdefault("id", entry.name[:-5])
+                rows.append((post["id"], post.get("postDate", ""), orjson.dumps(post), post.get("views", 0)))
+    if rows:
+        with POSTS_DB_LOCK:
+            posts_db.executemany("INSERT OR REPLACE INTO posts (id, post_date, json, views) VALUES (?, ?, ?, ?)", rows)
+            posts_db.commit()
+        print(f"Imported {len(rows)} posts from {POSTS_DIR} into {POSTS_DB}")
+
+def save_post(post_id: str, post_data: dict) -> str:
+    """
+    게시물을 DB에 저장하고, 함께 저장한 태그 제거 본문(content_text)을 반환
+    """
+    # export 때마다 HTML을 다시 파싱하지 않도록 저장 시점에 한 번만 태그 제거
+    content_text = strip_html_tags(post_data.get("content") or "")
+    with POSTS_DB_LOCK:
+        posts_db.execute(
+            "INSERT OR REPLACE INTO posts (id, post_date, json, views, content_text) VALUES (?, ?, ?, ?, ?)",
+            (post_id, post_data.get("postDate", ""), orjson.dumps(post_data), post_data.get("views", 0), content_text)
+        )
+        posts_db.commit()
+    return content_text
+
+def add_post_views(deltas: Dict[str, int]):
+    with POSTS_DB_LOCK:
+        posts_db.executemany(
+            "UPDATE posts SET views = views + ? WHERE id = ?",
+            [(delta, post_id) for post_id, delta in deltas.items()]
+        )
+        posts_db.commit()
+
+def fetch_post(post_id: str) -> Optional[dict]:
+    with POSTS_DB_LOCK:
+        row = posts_db.execute("SELECT json, views FROM posts WHERE id = ?", (post_id,)).fetchone()
+    if row is None:
+        return None
+    post = orjson.loads(row[0])
+    post["views"] = row[1]
+    post.setdefault("uploaded_images", [])
+    return post
+
+def lowercase_fields(post: dict) -> Tuple[str, str]:
+    return (post.get("title") or "").lower(), (post.get("content") or "").lower()
+
+def index_attachments(post: dict):
+    for attachment in post.get("attachments") or []:
+        name = attachment.get("name") or ""
+        # 첨부파일은 "{id}{정리된 파일명의 확장자}"로 저장됨
+        saved_filename = attachment["id"] + os.path.splitext(name)[1]
+        ATTACHMENT_INDEX[attachment["id"]] = {
+            "post_id": post["id"],
+            "saved_filename": saved_filename,
+            # original_filename이 있으면 사용, 없으면 name 사용
+            "original_filename": attachment.get("original_filename") or name or saved_filename,
+        }
 
-def load_post_from_file(post_id: str) -> Optional[dict]:
-    file_path = os.path.join(POSTS_DIR, f"{post_id}.json")
-    if os.path.exists(file_path):
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return None
+def cache_post(post: dict):
+    """
+    게시물을 캐시에 추가하거나 교체하고 정렬 목록 내 위치를 갱신
+    """
+    global POSTS_VERSION
+    POSTS_VERSION += 1
+    post_id = post["id"]
+    old = POSTS_CACHE.get(post_id)
+    if old is not None:
+        for i, cached in enumerate(POSTS_SORTED):
+            if cached is old:
+                del POSTS_SORTED[i]
+                break
+    POSTS_CACHE[post_id] = post
+    POSTS_LC[post_id] = lowercase_fields(post)
+    index_attachments(post)
+
+    # postDate 내림차순 위치를 이진 탐색 (같은 날짜 중에서는 가장 앞에 추가)
+    post_date = post.get("postDate", "")
+    lo, hi = 0, len(POSTS_SORTED)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if POSTS_SORTED[mid].get("postDate", "") > post_date:
+            lo = mid + 1
+        else:
+            hi = mid
+    POSTS_SORTED.insert(lo, post)
+
+def read_posts_versions() -> Tuple[int, int]:
+    # data_version은 다른 연결이 커밋했을 때만 바뀜 (이 프로세스의 쓰기는 캐시에 이미 반영됨)
+    with POSTS_DB_LOCK:
+        data_version = posts_db.execute("PRAGMA data_version").fetchone()[0]
+        content_version = posts_db.execute("SELECT value FROM posts_meta WHERE name = 'posts_version'").fetchone()[0]
+    return data_version, content_version
 
-def get_all_posts() -> List[dict]:
+def read_posts() -> Tuple[int, int, list]:
+    """
+    DB의 모든 게시물을 읽어 (data_version, posts_version, [(게시물, 소문자 필드, content_text)])로 반환
+    (파싱까지 끝내 두므로 asyncio.to_thread로 호출)
+    """
+    # 버전을 먼저 읽어야 그 뒤에 커밋된 변경을 다음 확인 때 놓치지 않음
+    data_version, content_version = read_posts_versions()
+    with POSTS_DB_LOCK:
+        rows = posts_db.execute("SELECT id, json, views, content_text FROM posts ORDER BY post_date DESC").fetchall()
     posts = []
-    for filename in os.listdir(POSTS_DIR):
-        if filename.endswith('.json'):
-            post_id = filename[:-5]
-            post = load_post_from_file(post_id)
-            if post:
-                posts.append(post)
-    return sorted(posts, key=lambda x: x.get('postDate', ''), reverse=True)
+    for post_id, data, views, content_text in rows:
+        post = orjson.loads(data)
+        post.setdefault("uploaded_images", [])
+        post["views"] = views
+        posts.append((post, lowercase_fields(post), content_text))
+    return data_version, content_version, posts
+
+def read_posts_views() -> Tuple[int, int, list]:
+    data_version, content_version = read_posts_versions()
+    with POSTS_DB_LOCK:
+        rows = posts_db.execute("SELECT id, views FROM posts").fetchall()
+    return data_version, content_version, rows
+
+def apply_posts(data_version: int, content_version: int, posts: list):
+    """
+    read_posts 결과로 캐시 전체를 교체
+    """
+    global POSTS_VERSION, posts_db_version, posts_content_version
+    POSTS_CACHE.clear()
+    POSTS_LC.clear()
+    POSTS_TEXT.clear()
+    ATTACHMENT_INDEX.clear()
+    for post, lc_fields, content_text in posts:
+        post_id = post["id"]
+        # 아직 DB에 반영하지 않은 이 프로세스의 조회수 증가분 유지
+        post["views"] += VIEWS_DELTA.get(post_id, 0)
+        POSTS_CACHE[post_id] = post
+        POSTS_LC[post_id] = lc_fields
+        if content_text is not None:
+            POSTS_TEXT[post_id] = content_text
+        index_attachments(post)
+    # DB에서 이미 postDate 내림차순으로 읽었으므로 삽입 순서 그대로 사용
+    POSTS_SORTED[:] = POSTS_CACHE.values()
+    POSTS_VERSION += 1
+    posts_db_version = data_version
+    posts_content_version = content_version
+
+def apply_views(data_version: int, rows: list):
+    """
+    read_posts_views 결과로 캐시된 게시물의 조회수만 갱신
+    """
+    global POSTS_VERSION, posts_db_version
+    for post_id, views in rows:
+        post = POSTS_CACHE.get(post_id)
+        if post is not None:
+            post["views"] = views + VIEWS_DELTA.get(post_id, 0)
+    POSTS_VERSION += 1
+    posts_db_version = data_version
+
+def load_posts_cache():
+    global posts_checked_at
+    apply_posts(*read_posts())
+    posts_checked_at = time.monotonic()
+
+async def refresh_posts_cache():
+    """
+    다른 프로세스(다른 uvicorn 워커 등)가 DB를 변경했으면 캐시를 다시 로드
+    (게시물 내용은 그대로고 조회수만 바뀌었으면 views 컬럼만 다시 읽음)
+    """
+    global posts_checked_at
+    if posts_db is None or time.monotonic() - posts_checked_at < POSTS_CHECK_INTERVAL:
+        return
+    posts_checked_at = time.monotonic()
+    # 게시물 생성/조회수 flush와 겹치지 않도록 POSTS_LOCK 안에서 읽고 교체
+    async with POSTS_LOCK:
+        data_version, content_version = await asyncio.to_thread(read_posts_versions)
+        if data_version == posts_db_version:
+            return
+        if content_version == posts_content_version:
+            data_version, content_version, rows = await asyncio.to_thread(read_posts_views)
+            if content_version == posts_content_version:
+                apply_views(data_version, rows)
+                return
+        posts = await asyncio.to_thread(read_posts)
+        # 다른 프로세스가 만든 게시물의 첨부파일/이미지도 export 등에서 찾을 수 있도록 파일 인덱스도 다시 스캔
+        file_indexes = await asyncio.to_thread(scan_file_indexes)
+        apply_posts(*posts)
+        merge_file_indexes(file_indexes)
+
+async def load_post(post_id: str) -> Optional[dict]:
+    await refresh_posts_cache()
+    post = POSTS_CACHE.get(post_id)
+    if post is not None:
+        return post
+    # 캐시에 없으면 DB에서 직접 읽어 캐시에 추가
+    post = await asyncio.to_thread(fetch_post, post_id)
+    if post is not None:
+        cache_post(post)
+    return post
+
+async def get_all_posts() -> List[dict]:
+    await refresh_posts_cache()
+    return POSTS_SORTED
+
+async def flush_views():
+    """
+    누적된 조회수 증가분을 DB의 views 컬럼과 ES에 증가분만 반영
+    """
+    if not VIEWS_DELTA:
+        return
+    async with POSTS_LOCK:
+        deltas = dict(VIEWS_DELTA)
+        try:
+            await asyncio.to_thread(add_post_views, deltas)
+        except Exception as e:
+            # VIEWS_DELTA에 그대로 남겨 두고 다음 주기에 다시 시도
+            print(f"Error flushing views: {e}")
+            return
+        # 커밋이 끝난 뒤에 빼야 그 사이 캐시를 다시 로드해도 조회수가 빠지지 않음
+        VIEWS_DELTA.subtract(deltas)
+        for post_id in deltas:
+            if VIEWS_DELTA[post_id] <= 0:
+                del VIEWS_DELTA[post_id]
+    await es_update_views(deltas)
+
+async def views_flush_loop():
+    while True:
+        await asyncio.sleep(VIEWS_FLUSH_INTERVAL)
+        await flush_views()
+
+_SCRIPT_STYLE_RE = re.compile(r"<\s*(script|style)[^>]*>[\s\S]*?<\s*/\s*\1\s*>", re.IGNORECASE)
+_TAG_RE = re.compile(r"<[^>]+>")
+_WS_RE = re.compile(r"\s+")
 
 def strip_html_tags(html: str) -> str:
     if not html:
         return ""
     # remove script/style content
-    html = re.sub(r"<\s*(script|style)[^>]*>[\s\S]*?<\s*/\s*\1\s*>", " ", html, flags=re.IGNORECASE)
+    html = _SCRIPT_STYLE_RE.sub(" ", html)
     # remove tags
-    text = re.sub(r"<[^>]+>", " ", html)
+    text = _TAG_RE.sub(" ", html)
     # unescape entities
     text = unescape(text)
     # collapse whitespace
-    text = re.sub(r"\s+", " ", text).strip()
+    text = _WS_RE.sub(" ", text).strip()
     return text
 
-def find_file_by_prefix(directory: str, prefix: str) -> Optional[str]:
-    for filename in os.listdir(directory):
-        if filename.startswith(prefix):
-            return os.path.join(directory, filename)
-    return None
+def get_content_text(post: dict) -> str:
+    content_text = POSTS_TEXT.get(post.get("id"))
+    if content_text is None:
+        # 저장된 값이 없으면(DB에서 직접 읽어온 게시물 등) 그때 계산
+        content_text = strip_html_tags(post.get("content", ""))
+    return content_text
+
+def scan_file_indexes() -> Dict[str, Dict[str, str]]:
+    indexes = {}
+    for directory in FILE_INDEX:
+        index = indexes[directory] = {}
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.is_file():
+                    index[os.path.splitext(entry.name)[0]] = entry.name
+    return indexes
+
+def merge_file_indexes(indexes: Dict[str, Dict[str, str]]):
+    # 파일은 삭제하지 않으므로 교체하지 않고 합침 (스캔 중에 이 프로세스가 저장한 파일이 빠지지 않도록)
+    for directory, index in indexes.items():
+        FILE_INDEX[directory].update(index)
+
+def load_file_indexes():
+    merge_file_indexes(scan_file_indexes())
+
+def find_file_by_id(directory: str, file_id: str) -> Optional[str]:
+    filename = FILE_INDEX[directory].get(file_id)
+    return os.path.join(directory, filename) if filename else None
+
+def encode_file_base64(file_path: str) -> str:
+    # 파일 크기만큼 버퍼를 미리 잡고 버퍼링 없이 읽음 (read 한 번에 다 안 읽힐 수 있으므로 찰 때까지 반복)
+    with open(file_path, "rb", buffering=0) as f:
+        buf = bytearray(os.fstat(f.fileno()).st_size)
+        view = memoryview(buf)
+        n = 0
+        while n < len(buf):
+            read = f.readinto(view[n:])
+            if not read:
+                break
+            n += read
+    return base64.b64encode(view[:n]).decode("ascii")
 
 def build_absolute_url(relative_url: str, base_url: Optional[str]) -> str:
     if not base_url:
@@ -191,12 +645,204 @@ def build_absolute_url(relative_url: str, base_url: Optional[str]) -> str:
     return base_url.rstrip('/') + relative_url
 
 def index_post_to_es(post_data: dict):
-    es = get_es_client()
-    if es:
+    # 실제 색인은 es_index_worker가 모아서 bulk로 처리
+    ES_INDEX_QUEUE.put_nowait(dict(post_data))
+
+async def bulk_index_posts(posts: List[dict]):
+    es = await get_es_client()
+    if not es:
+        return
+    actions = [{"_index": "posts", "_id": post["id"], "_source": post} for post in posts]
+    try:
+        await helpers.async_bulk(
+            es, actions,
+            chunk_size=ES_BULK_CHUNK_SIZE, max_chunk_bytes=ES_BULK_MAX_BYTES
+        )
+    except Exception as e:
+        print(f"Elasticsearch bulk indexing error: {e}")
+
+async def es_update_views(deltas: Dict[str, int]):
+    """
+    게시물 전체를 다시 색인하지 않고 views 필드만 스크립트로 증가
+    """
+    es = await get_es_client()
+    if not es:
+        return
+    actions = [
+        {
+            "_op_type": "update",
+            "_index": "posts",
+            "_id": post_id,
+            "script": {"source": "ctx._source.views += params.d", "params": {"d": delta}},
+        }
+        for post_id, delta in deltas.items()
+    ]
+    try:
+        # 아직 색인되지 않은 게시물(404)은 무시
+        await helpers.async_bulk(es, actions, chunk_size=ES_BULK_CHUNK_SIZE, raise_on_error=False)
+    except Exception as e:
+        print(f"Elasticsearch views update error: {e}")
+
+async def reindex_all() -> int:
+    """
+    모든 게시물을 색인 대기열에 넣음 (ES_INDEX_WORKERS개 워커가 나눠서 bulk로 병렬 처리)
+    """
+    posts = list(await get_all_posts())
+    for post in posts:
+        # 아직 flush하지 않은 조회수 증가분은 flush_views가 es_update_views로 따로 더하므로 빼고 색인
+        index_post_to_es({**post, "views": post["views"] - VIEWS_DELTA.get(post["id"], 0)})
+    return len(posts)
+
+async def es_index_worker():
+    """
+    대기열의 게시물을 모아서 bulk로 색인. None을 받으면 모아 둔 것까지 보내고 종료 (shutdown_event에서 사용)
+    """
+    stop = False
+    while not stop:
+        post = await ES_INDEX_QUEUE.get()
+        if post is None:
+            ES_INDEX_QUEUE.task_done()
+            return
+        batch = [post]
+        # 대기열이 chunk 하나를 채우지 못하면 잠시 더 모아서 한 번에 보냄
+        if ES_INDEX_QUEUE.qsize() < ES_BULK_CHUNK_SIZE:
+            await asyncio.sleep(ES_INDEX_FLUSH_INTERVAL)
+        while len(batch) < ES_BULK_CHUNK_SIZE and not ES_INDEX_QUEUE.empty():
+            post = ES_INDEX_QUEUE.get_nowait()
+            if post is None:
+                stop = True
+                break
+            batch.append(post)
+        await bulk_index_posts(batch)
+        for _ in range(len(batch) + stop):
+            ES_INDEX_QUEUE.task_done()
+
+async def set_es_refresh_interval(interval: str):
+    es = await get_es_client()
+    if not es:
+        return
+    try:
+        await es.indices.put_settings(index="posts", settings={"index": {"refresh_interval": interval}})
+    except Exception as e:
+        print(f"Elasticsearch settings update error: {e}")
+
+async def restore_es_refresh_interval(retry: bool):
+    """
+    refresh_interval을 ES_REFRESH_INTERVAL로 되돌림. 되돌리지 못하면 새 게시물이 검색되지 않으므로
+    retry이면 성공할 때까지 재시도 (ping 결과 캐시로 건너뛰지 않도록 클라이언트에 직접 요청)
+    """
+    while True:
+        client = _ES_STATE["client"]
+        if client is None:
+            # 한 번도 연결하지 못했으면 -1로 바꾼 적도 없음
+            return
         try:
-            es.index(index="posts", id=post_data["id"], body=post_data)
+            await client.indices.put_settings(index="posts", settings={"index": {"refresh_interval": ES_REFRESH_INTERVAL}})
+            return
         except Exception as e:
-            print(f"Elasticsearch indexing error: {e}")
+            print(f"Elasticsearch settings update error: {e}")
+        if not retry:
+            return
+        await asyncio.sleep(ES_SETTINGS_RETRY_INTERVAL)
+
+async def reindex_with_refresh_disabled():
+    """
+    색인하는 동안 refresh를 끄고, 대기열이 모두 처리되면(중단되어도) 원래 refresh_interval로 되돌림
+    """
+    await set_es_refresh_interval("-1")
+    cancelled = False
+    try:
+        await reindex_all()
+        await ES_INDEX_QUEUE.join()
+    except asyncio.CancelledError:
+        cancelled = True
+        raise
+    finally:
+        # 종료 중(취소)에는 한 번만 시도 (실패해도 다음 startup_event에서 다시 적용)
+        await restore_es_refresh_interval(retry=not cancelled)
+
+def new_id(nbytes: int, taken: Dict[str, object]) -> str:
+    # 드물지만 이미 쓰인 ID가 나오면 다시 생성
+    while True:
+        new = secrets.token_hex(nbytes)
+        if new not in taken:
+            return new
+
+def write_upload_file(src, file_path: str) -> int:
+    """
+    업로드 파일 내용을 file_path에 복사하고 기록한 바이트 수를 반환
+    (open/write/close를 스레드 전환 한 번으로 처리하도록 asyncio.to_thread로 호출)
+    """
+    with open(file_path, 'wb') as f:
+        shutil.copyfileobj(src, f, UPLOAD_CHUNK_SIZE)
+        return f.tell()
+
+async def _save_attachment(file: UploadFile) -> Optional[dict]:
+    try:
+        file_id = new_id(4, FILE_INDEX[UPLOADS_DIR])
+        # 원본 파일명 정리 (한글 처리)
+        clean_original_name = clean_filename(file.filename)
+        file_extension = os.path.splitext(clean_original_name)[1] or ""
+        saved_filename = f"{file_id}{file_extension}"
+        file_path = os.path.join(UPLOADS_DIR, saved_filename)
+        
+        async with IO_SEM:
+            file_size = await asyncio.to_thread(write_upload_file, file.file, file_path)
+        FILE_INDEX[UPLOADS_DIR][file_id] = saved_filename
+        
+        return {
+            "id": file_id,
+            "name": clean_original_name,
+            "size": format_size(file_size),
+            "downloadUrl": f"/api/attachments/{file_id}/download",
+            "original_filename": file.filename
+        }
+    except Exception as e:
+        print(f"Error processing attachment {file.filename}: {e}")
+        return None
+
+async def _save_image(image: UploadFile) -> Optional[Tuple[dict, str]]:
+    """
+    게시물 이미지를 저장하고 (uploaded_images 항목, 본문에 붙일 img 태그)를 반환
+    """
+    # 이미지 파일인지 확인
+    content_type = image.content_type
+    if content_type not in ALLOWED_IMAGE_TYPES:
+        if content_type and content_type.startswith("image/"):
+            print(f"Unsupported image type: {content_type} for file {image.filename}")
+        elif content_type:
+            print(f"File is not an image: {content_type} for file {image.filename}")
+        return None
+    
+    try:
+        image_id = new_id(6, FILE_INDEX[IMAGES_DIR])
+        
+        # 원본 파일명 정리 (한글 제거)
+        clean_original_name = clean_filename(image.filename)
+        file_extension = os.path.splitext(clean_original_name)[1] or ".jpg"
+        
+        # 저장될 파일명 생성 (고유 ID + 확장자)
+        saved_filename = f"{image_id}{file_extension}"
+        file_path = os.path.join(IMAGES_DIR, saved_filename)
+        
+        async with IO_SEM:
+            await asyncio.to_thread(write_upload_file, image.file, file_path)
+        FILE_INDEX[IMAGES_DIR][image_id] = saved_filename
+        
+        image_url = f"/static/images/{saved_filename}"
+        uploaded_image = {
+            "id": image_id,
+            "filename": clean_original_name,
+            "url": image_url,
+            "original_filename": image.filename  # 원본 파일명도 보존
+        }
+        
+        # alt 속성에는 정리된 파일명 사용
+        image_tag = f'<img src="{image_url}" alt="{clean_original_name}" style="max-width: 100%; height: auto;">'
+        return uploaded_image, image_tag
+    except Exception as e:
+        print(f"Error processing image {image.filename}: {e}")
+        return None
 
 @app.post("/api/posts", response_model=PostResponse)
 async def create_post(
@@ -210,97 +856,34 @@ async def create_post(
     files: List[UploadFile] = File([], description="첨부파일 목록 (단일 또는 다중 파일)"),
     images: List[UploadFile] = File([], description="게시물 내용에 삽입할 이미지 목록 (단일 또는 다중 파일)")
 ):
-    post_id = str(uuid.uuid4()).replace('-', '')[:9]
+    await refresh_posts_cache()
+    post_id = new_id(5, POSTS_CACHE)
     
     try:
         badges_list = json.loads(badges) if badges else []
     except:
         badges_list = []
     
-    attachments = []
-    if files and len(files) > 0:
-        for file in files:
-            # 빈 파일이 아닌지 확인
-            if file.filename and file.filename.strip():
-                try:
-                    file_id = str(uuid.uuid4())[:8]
-                    # 원본 파일명 정리 (한글 처리)
-                    clean_original_name = clean_filename(file.filename)
-                    file_extension = os.path.splitext(clean_original_name)[1] or ""
-                    saved_filename = f"{file_id}{file_extension}"
-                    file_path = os.path.join(UPLOADS_DIR, saved_filename)
-                    
-                    async with aiofiles.open(file_path, 'wb') as f:
-                        file_content = await file.read()
-                        await f.write(file_content)
-                    
-                    file_size = len(file_content)
-                    if file_size < 1024:
-                        size_str = f"{file_size}B"
-                    elif file_size < 1024 * 1024:
-                        size_str = f"{file_size//1024}KB"
-                    else:
-                        size_str = f"{file_size//(1024*1024)}MB"
-                    
-                    attachment = {
-                        "id": file_id,
-                        "name": clean_original_name,
-                        "size": size_str,
-                        "downloadUrl": f"/api/attachments/{file_id}/download",
-                        "original_filename": file.filename
-                    }
-                    attachments.append(attachment)
-                except Exception as e:
-                    print(f"Error processing attachment {file.filename}: {e}")
-    
-    uploaded_images = []
-    image_tags = []
+    attachments = [
+        attachment
+        for attachment in await asyncio.gather(
+            *[_save_attachment(file) for file in files if file.filename and file.filename.strip()]
+        )
+        if attachment
+    ]
     
-    if images and len(images) > 0:
-        for image in images:
-            # 빈 파일이 아니고 이미지 파일인지 확인
-            if (image.filename and image.filename.strip() and 
-                hasattr(image, 'content_type') and image.content_type):
-                
-                if image.content_type.startswith("image/"):
-                    allowed_types = ["image/jpeg", "image/jpg", "image/png", "image/gif", "image/webp", "image/bmp"]
-                    if image.content_type in allowed_types:
-                        try:
-                            image_id = str(uuid.uuid4())[:12]
-                            
-                            # 원본 파일명 정리 (한글 제거)
-                            clean_original_name = clean_filename(image.filename)
-                            file_extension = os.path.splitext(clean_original_name)[1] or ".jpg"
-                            
-                            # 저장될 파일명 생성 (고유 ID + 확장자)
-                            saved_filename = f"{image_id}{file_extension}"
-                            file_path = os.path.join(IMAGES_DIR, saved_filename)
-                            
-                            async with aiofiles.open(file_path, 'wb') as f:
-                                image_content = await image.read()
-                                await f.write(image_content)
-                            
-                            image_url = f"/static/images/{saved_filename}"
-                            uploaded_images.append({
-                                "id": image_id,
-                                "filename": clean_original_name,
-                                "url": image_url,
-                                "original_filename": image.filename  # 원본 파일명도 보존
-                            })
-                            
-                            # alt 속성에는 정리된 파일명 사용
-                            image_tag = f'<img src="{image_url}" alt="{clean_original_name}" style="max-width: 100%; height: auto;">'
-                            image_tags.append(image_tag)
-                        except Exception as e:
-                            print(f"Error processing image {image.filename}: {e}")
-                    else:
-                        print(f"Unsupported image type: {image.content_type} for file {image.filename}")
-                else:
-                    print(f"File is not an image: {image.content_type} for file {image.filename}")
+    saved_images = [
+        saved
+        for saved in await asyncio.gather(
+            *[_save_image(image) for image in images if image.filename and image.filename.strip()]
+        )
+        if saved
+    ]
+    uploaded_images = [uploaded_image for uploaded_image, _ in saved_images]
+    image_tags = [image_tag for _, image_tag in saved_images]
     
     if image_tags:
-        images_html = "<div>" + "".join(image_tags) + "</div>"
-        content = content + images_html
+        content = f'{content}<div>{"".join(image_tags)}</div>'
     
     post_data = {
         "id": post_id,
@@ -317,158 +900,183 @@ async def create_post(
         "uploaded_images": uploaded_images
     }
     
-    save_post_to_file(post_id, post_data)
+    async with POSTS_LOCK:
+        # 본문이 큰 게시물의 태그 제거/JSON 직렬화/쓰기가 이벤트 루프를 막지 않도록 스레드에서 처리
+        content_text = await asyncio.to_thread(save_post, post_id, post_data)
+        cache_post(post_data)
+        POSTS_TEXT[post_id] = content_text
     index_post_to_es(post_data)
     
     response_data = {**post_data}
     if uploaded_images:
         response_data["message"] = f"Post created successfully with {len(uploaded_images)} image(s) uploaded"
     
+    if len(content) > LARGE_CONTENT_SIZE:
+        return await asyncio.to_thread(lambda: PostResponse(**response_data))
     return PostResponse(**response_data)
 
 @app.get("/api/posts", response_model=List[PostResponse])
-async def get_posts():
-    posts = get_all_posts()
-    for post in posts:
-        if "uploaded_images" not in post:
-            post["uploaded_images"] = []
-    return [PostResponse(**post) for post in posts]
+async def get_posts(request: Request):
+    # 다른 프로세스의 변경을 먼저 반영해야 ETag가 현재 캐시 내용과 일치함
+    await refresh_posts_cache()
+    etag = f'W/"{POSTS_ETAG_PREFIX}-{POSTS_VERSION}"'
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers={"ETag": etag})
+    # 캐시된 게시물은 이미 PostResponse 형식이므로 검증 없이 바로 직렬화
+    return Response(orjson.dumps(POSTS_SORTED), media_type="application/json", headers={"ETag": etag})
 
 @app.get("/api/posts/{post_id}", response_model=PostResponse)
 async def get_post(post_id: str):
-    post = load_post_from_file(post_id)
+    global POSTS_VERSION
+    post = await load_post(post_id)
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     
-    if "uploaded_images" not in post:
-        post["uploaded_images"] = []
-    
+    # 조회수는 메모리에서만 올리고 DB 저장은 views_flush_loop에서 일괄 처리
     post["views"] += 1
-    save_post_to_file(post_id, post)
+    VIEWS_DELTA[post_id] += 1
+    POSTS_VERSION += 1
     
     return PostResponse(**post)
 
 @app.get("/api/attachments/{file_id}/download")
 async def download_attachment(file_id: str):
-    # 저장된 파일 찾기
-    saved_filename = None
-    for filename in os.listdir(UPLOADS_DIR):
-        if filename.startswith(file_id):
-            saved_filename = filename
-            break
-    
-    if not saved_filename:
+    await refresh_posts_cache()
+    attachment = ATTACHMENT_INDEX.get(file_id)
+    if not attachment:
         raise HTTPException(status_code=404, detail="File not found")
     
-    # 게시물에서 원본 파일명 찾기
-    original_filename = saved_filename  # 기본값은 저장된 파일명
-    posts = get_all_posts()
-    
-    for post in posts:
-        if "attachments" in post:
-            for attachment in post["attachments"]:
-                if attachment["id"] == file_id:
-                    # original_filename이 있으면 사용, 없으면 name 사용
-                    original_filename = attachment.get("original_filename", attachment.get("name", saved_filename))
-                    break
-    
-    file_path = os.path.join(UPLOADS_DIR, saved_filename)
-    return FileResponse(file_path, filename=original_filename)
+    file_path = os.path.join(UPLOADS_DIR, attachment["saved_filename"])
+    if not os.path.isfile(file_path):
+        raise HTTPException(status_code=404, detail="File not found")
+    return FileResponse(file_path, filename=attachment["original_filename"])
 
-@app.get("/api/export/posts")
-async def export_posts(
-    format: str = Query("json", regex="^(json|zip)$", description="출력 형식: json (JSON 응답) 또는 zip (ZIP 파일 다운로드)"),
-    include_files: str = Query("metadata", regex="^(none|metadata|files)$", description="첨부/이미지 포함 수준: none|metadata|files"),
-    base_url: Optional[str] = Query(None, description="상대 경로 앞에 붙일 Base URL (예: https://example.com:8002)"),
-):
+_MIME_TYPES: Dict[str, str] = {}
+
+def guess_mime_type(file_path: str) -> str:
+    # 확장자 종류가 몇 개 안 되므로 확장자별로 결과를 캐시
+    ext = os.path.splitext(file_path)[1].lower()
+    mime = _MIME_TYPES.get(ext)
+    if mime is None:
+        mime = mimetypes.guess_type("x" + ext)[0] or "application/octet-stream"
+        _MIME_TYPES[ext] = mime
+    return mime
+
+def _materialize(item: dict, directory: str, include_files: str) -> dict:
     """
-    모든 게시물과 연관 첨부파일 및 이미지를 내보내는 Export API
-    - format=json: JSON 형태로 응답 (기존 동작)
-    - format=zip: ZIP 파일로 다운로드 (posts.json + 모든 첨부파일/이미지 포함)
+    export 항목에 실제 파일의 경로/MIME/크기(및 base64 내용)를 채워 반환
     """
-    posts = get_all_posts()
-    
-    if format == "json":
-        # 기존 JSON 응답 로직
-        exported = []
-        for post in posts:
-            uploaded_images = post.get("uploaded_images") or []
-            attachments = post.get("attachments") or []
+    if include_files not in ("metadata", "files"):
+        return item
+    file_path = find_file_by_id(directory, item["id"])
+    try:
+        size_bytes = os.stat(file_path).st_size if file_path else None
+    except OSError:
+        size_bytes = None
+    if size_bytes is None:
+        item["path"] = None
+        return item
+    item["path"] = file_path
+    item["mime_type"] = guess_mime_type(file_path)
+    item["size_bytes"] = size_bytes
+    return item
 
-            content_html = post.get("content", "")
-            content_text = strip_html_tags(content_html)
-
-            export_attachments = []
-            for att in attachments:
-                att_id = att.get("id")
-                item = {
-                    "id": att_id,
-                    "name": att.get("name"),
-                    "size_display": att.get("size"),
-                    "download_url": build_absolute_url(att.get("downloadUrl", ""), base_url),
-                }
+def _try_encode_file_base64(file_path: str) -> Optional[str]:
+    try:
+        return encode_file_base64(file_path)
+    except Exception:
+        return None
 
-                if include_files in ("metadata", "files"):
-                    file_path = find_file_by_prefix(UPLOADS_DIR, att_id)
-                    if file_path and os.path.exists(file_path):
-                        mime, _ = mimetypes.guess_type(file_path)
-                        try:
-                            size_bytes = os.path.getsize(file_path)
-                        except Exception:
-                            size_bytes = None
-                        item.update({
-                            "path": file_path,
-                            "mime_type": mime or "application/octet-stream",
-                            "size_bytes": size_bytes,
-                        })
-                        if include_files == "files":
-                            try:
-                                with open(file_path, "rb") as f:
-                                    b = f.read()
-                                item["content_base64"] = base64.b64encode(b).decode("utf-8")
-                                item["content_encoding"] = "base64"
-                            except Exception:
-                                pass
-                    else:
-                        item.update({"path": None})
-                export_attachments.append(item)
-
-            export_images = []
-            for img in uploaded_images:
-                img_id = img.get("id")
-                rel_url = img.get("url", "")
-                item = {
-                    "id": img_id,
-                    "filename": img.get("filename"),
-                    "url": build_absolute_url(rel_url, base_url),
-                }
+def embed_file_contents(items: List[dict]):
+    """
+    파일 읽기+base64 인코딩은 서로 독립적인 I/O라 스레드 풀에서 병렬로 처리해 각 항목에 채움
+    """
+    items = [item for item in items if item.get("path")]
+    if not items:
+        return
+    with ThreadPoolExecutor(max_workers=EXPORT_READ_WORKERS) as pool:
+        encoded = pool.map(_try_encode_file_base64, [item["path"] for item in items])
+        for item, content in zip(items, encoded):
+            if content is not None:
+                item["content_base64"] = content
+                item["content_encoding"] = "base64"
 
-                if include_files in ("metadata", "files"):
-                    file_path = find_file_by_prefix(IMAGES_DIR, img_id)
-                    if file_path and os.path.exists(file_path):
-                        mime, _ = mimetypes.guess_type(file_path)
-                        try:
-                            size_bytes = os.path.getsize(file_path)
-                        except Exception:
-                            size_bytes = None
-                        item.update({
-                            "path": file_path,
-                            "mime_type": mime or "application/octet-stream",
-                            "size_bytes": size_bytes,
-                        })
-                        if include_files == "files":
-                            try:
-                                with open(file_path, "rb") as f:
-                                    b = f.read()
-                                item["content_base64"] = base64.b64encode(b).decode("utf-8")
-                                item["content_encoding"] = "base64"
-                            except Exception:
-                                pass
-                    else:
-                        item.update({"path": None})
-                export_images.append(item)
-
-            exported.append({
+def build_json_export(posts: List[dict], include_files: str, base_url: Optional[str]) -> bytes:
+    """
+    JSON export 응답 본문을 만들어 직렬화된 바이트로 반환
+    """
+    exported = []
+    for post in posts:
+        uploaded_images = post.get("uploaded_images") or []
+        attachments = post.get("attachments") or []
+
+        content_html = post.get("content", "")
+        content_text = get_content_text(post)
+
+        export_attachments = [
+            _materialize({
+                "id": att.get("id"),
+                "name": att.get("name"),
+                "size_display": att.get("size"),
+                "download_url": build_absolute_url(att.get("downloadUrl", ""), base_url),
+            }, UPLOADS_DIR, include_files)
+            for att in attachments
+        ]
+        export_images = [
+            _materialize({
+                "id": img.get("id"),
+                "filename": img.get("filename"),
+                "url": build_absolute_url(img.get("url", ""), base_url),
+            }, IMAGES_DIR, include_files)
+            for img in uploaded_images
+        ]
+
+        exported.append({
+            "id": post.get("id"),
+            "title": post.get("title"),
+            "content_html": content_html,
+            "content_text": content_text,
+            "metadata": {
+                "department": post.get("department"),
+                "author": post.get("author"),
+                "category": post.get("category"),
+                "badges": post.get("badges", []),
+                "postDate": post.get("postDate"),
+                "endDate": post.get("endDate"),
+                "views": post.get("views", 0),
+            },
+            "attachments": export_attachments,
+            "images": export_images,
+        })
+
+    if include_files == "files":
+        embed_file_contents([item for post in exported for item in (*post["attachments"], *post["images"])])
+
+    return orjson.dumps({
+        "exported_at": datetime.utcnow().isoformat() + "Z",
+        "include_files": include_files,
+        "count": len(exported),
+        "posts": exported,
+    })
+
+def zip_compress_type(file_path: str) -> int:
+    if os.path.splitext(file_path)[1].lower() in ZIP_STORED_EXTENSIONS:
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+def build_zip_export(posts: List[dict], include_files: str):
+    """
+    posts.json과 첨부파일/이미지를 담은 ZIP을 임시 파일(작으면 메모리)에 만들어 처음 위치로 되돌려 반환
+    """
+    zip_file = tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_MAX_SIZE)
+    with zipfile.ZipFile(zip_file, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as zipf:
+        posts_data = []
+        for post in posts:
+            content_html = post.get("content", "")
+            content_text = get_content_text(post)
+            
+            post_export = {
                 "id": post.get("id"),
                 "title": post.get("title"),
                 "content_html": content_html,
@@ -482,118 +1090,100 @@ async def export_posts(
                     "endDate": post.get("endDate"),
                     "views": post.get("views", 0),
                 },
-                "attachments": export_attachments,
-                "images": export_images,
-            })
-
-        return {
-            "exported_at": datetime.utcnow().isoformat() + "Z",
-            "include_files": include_files,
-            "count": len(exported),
-            "posts": exported,
-        }
-    
-    else:  # format == "zip"
-        # ZIP 파일로 패키징하여 다운로드
-        with tempfile.TemporaryDirectory() as temp_dir:
-            export_dir = os.path.join(temp_dir, "posts_export")
-            os.makedirs(export_dir)
+                "attachments": [],
+                "images": []
+            }
             
-            # posts.json 파일 생성
-            posts_data = []
-            for post in posts:
-                content_html = post.get("content", "")
-                content_text = strip_html_tags(content_html)
-                
-                post_export = {
-                    "id": post.get("id"),
-                    "title": post.get("title"),
-                    "content_html": content_html,
-                    "content_text": content_text,
-                    "metadata": {
-                        "department": post.get("department"),
-                        "author": post.get("author"),
-                        "category": post.get("category"),
-                        "badges": post.get("badges", []),
-                        "postDate": post.get("postDate"),
-                        "endDate": post.get("endDate"),
-                        "views": post.get("views", 0),
-                    },
-                    "attachments": [],
-                    "images": []
-                }
-                
+            if include_files == "files":
                 # 첨부파일 처리
-                if include_files == "files":
-                    attachments_dir = os.path.join(export_dir, "attachments")
-                    os.makedirs(attachments_dir, exist_ok=True)
+                for att in post.get("attachments", []):
+                    att_id = att.get("id")
+                    original_name = att.get("original_filename") or att.get("name")
                     
-                    for att in post.get("attachments", []):
-                        att_id = att.get("id")
-                        original_name = att.get("original_filename") or att.get("name")
+                    file_path = find_file_by_id(UPLOADS_DIR, att_id)
+                    if file_path and os.path.exists(file_path):
+                        # 원본명으로 압축
+                        safe_name = f"{att_id}_{original_name}"
+                        zipf.write(file_path, arcname=f"attachments/{safe_name}", compress_type=zip_compress_type(file_path))
                         
-                        file_path = find_file_by_prefix(UPLOADS_DIR, att_id)
-                        if file_path and os.path.exists(file_path):
-                            # 파일 복사 (원본명으로 저장)
-                            safe_name = f"{att_id}_{original_name}"
-                            dest_path = os.path.join(attachments_dir, safe_name)
-                            shutil.copy2(file_path, dest_path)
-                            
-                            post_export["attachments"].append({
-                                "id": att_id,
-                                "original_name": original_name,
-                                "file_path": f"attachments/{safe_name}",
-                                "size_display": att.get("size")
-                            })
+                        post_export["attachments"].append({
+                            "id": att_id,
+                            "original_name": original_name,
+                            "file_path": f"attachments/{safe_name}",
+                            "size_display": att.get("size")
+                        })
                 
                 # 이미지 처리
-                if include_files == "files":
-                    images_dir = os.path.join(export_dir, "images")
-                    os.makedirs(images_dir, exist_ok=True)
+                for img in post.get("uploaded_images", []):
+                    img_id = img.get("id")
+                    original_name = img.get("original_filename") or img.get("filename")
                     
-                    for img in post.get("uploaded_images", []):
-                        img_id = img.get("id")
-                        original_name = img.get("original_filename") or img.get("filename")
+                    file_path = find_file_by_id(IMAGES_DIR, img_id)
+                    if file_path and os.path.exists(file_path):
+                        # 원본명으로 압축
+                        safe_name = f"{img_id}_{original_name}"
+                        zipf.write(file_path, arcname=f"images/{safe_name}", compress_type=zip_compress_type(file_path))
                         
-                        file_path = find_file_by_prefix(IMAGES_DIR, img_id)
-                        if file_path and os.path.exists(file_path):
-                            # 파일 복사 (원본명으로 저장)
-                            safe_name = f"{img_id}_{original_name}"
-                            dest_path = os.path.join(images_dir, safe_name)
-                            shutil.copy2(file_path, dest_path)
-                            
-                            post_export["images"].append({
-                                "id": img_id,
-                                "original_name": original_name,
-                                "file_path": f"images/{safe_name}",
-                                "url": img.get("url")
-                            })
-                
-                posts_data.append(post_export)
-            
-            # posts.json 저장
-            posts_json_path = os.path.join(export_dir, "posts.json")
-            with open(posts_json_path, 'w', encoding='utf-8') as f:
-                json.dump({
-                    "exported_at": datetime.utcnow().isoformat() + "Z",
-                    "include_files": include_files,
-                    "count": len(posts_data),
-                    "posts": posts_data
-                }, f, ensure_ascii=False, indent=2)
-            
-            # ZIP 파일 생성
-            zip_path = os.path.join(temp_dir, "posts_export.zip")
-            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                for root, dirs, files in os.walk(export_dir):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        arcname = os.path.relpath(file_path, export_dir)
-                        zipf.write(file_path, arcname)
+                        post_export["images"].append({
+                            "id": img_id,
+                            "original_name": original_name,
+                            "file_path": f"images/{safe_name}",
+                            "url": img.get("url")
+                        })
             
-            # ZIP 파일 반환
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"posts_export_{timestamp}.zip"
-            return FileResponse(zip_path, filename=filename, media_type="application/zip")
+            posts_data.append(post_export)
+        
+        zipf.writestr("posts.json", orjson.dumps({
+            "exported_at": datetime.utcnow().isoformat() + "Z",
+            "include_files": include_files,
+            "count": len(posts_data),
+            "posts": posts_data
+        }, option=orjson.OPT_INDENT_2))
+    
+    zip_file.seek(0)
+    return zip_file
+
+@app.get("/api/export/posts")
+async def export_posts(
+    format: str = Query("json", regex="^(json|zip)$", description="출력 형식: json (JSON 응답) 또는 zip (ZIP 파일 다운로드)"),
+    include_files: str = Query("metadata", regex="^(none|metadata|files)$", description="첨부/이미지 포함 수준: none|metadata|files"),
+    base_url: Optional[str] = Query(None, description="상대 경로 앞에 붙일 Base URL (예: https://example.com:8002)"),
+):
+    """
+    모든 게시물과 연관 첨부파일 및 이미지를 내보내는 Export API
+    - format=json: JSON 형태로 응답 (기존 동작)
+    - format=zip: ZIP 파일로 다운로드 (posts.json + 모든 첨부파일/이미지 포함)
+    """
+    posts = list(await get_all_posts())
+    
+    if format == "json":
+        # 본문 HTML 정리, base64 인코딩, 직렬화는 CPU 작업이므로 스레드에서 처리
+        body = await asyncio.to_thread(build_json_export, posts, include_files, base_url)
+        # FastAPI 기본 인코더(jsonable_encoder)를 거치지 않고 직렬화된 바이트를 그대로 반환
+        return Response(body, media_type="application/json")
+    
+    else:  # format == "zip"
+        # ZIP 파일로 패키징하여 다운로드 (원본 파일을 임시 디렉토리에 복사하지 않고 바로 압축)
+        zip_file = await asyncio.to_thread(build_zip_export, posts, include_files)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = f"posts_export_{timestamp}.zip"
+        return StreamingResponse(
+            iter(lambda: zip_file.read(ZIP_STREAM_CHUNK_SIZE), b""),
+            media_type="application/zip",
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+            background=BackgroundTask(zip_file.close),
+        )
+
+@app.post("/api/admin/reindex")
+async def reindex_posts():
+    """
+    모든 게시물을 Elasticsearch에 다시 색인 (bulk, 백그라운드 처리)
+    """
+    global reindex_task
+    if reindex_task and not reindex_task.done():
+        raise HTTPException(status_code=409, detail="Reindex already in progress")
+    reindex_task = asyncio.create_task(reindex_with_refresh_disabled())
+    return {"queued": len(await get_all_posts())}
 
 @app.post("/api/upload-image")
 async def upload_image(
@@ -602,22 +1192,21 @@ async def upload_image(
     """
     게시물 내용에 삽입할 이미지 업로드
     """
-    if not image.content_type or not image.content_type.startswith("image/"):
+    content_type = image.content_type
+    if content_type not in ALLOWED_IMAGE_TYPES:
+        if content_type and content_type.startswith("image/"):
+            raise HTTPException(status_code=400, detail="Unsupported image format")
         raise HTTPException(status_code=400, detail="Only image files are allowed")
     
-    allowed_types = ["image/jpeg", "image/jpg", "image/png", "image/gif", "image/webp"]
-    if image.content_type not in allowed_types:
-        raise HTTPException(status_code=400, detail="Unsupported image format")
-    
-    image_id = str(uuid.uuid4())[:12]
+    image_id = new_id(6, FILE_INDEX[IMAGES_DIR])
     file_extension = os.path.splitext(image.filename)[1] if image.filename else ".jpg"
     saved_filename = f"{image_id}{file_extension}"
     file_path = os.path.join(IMAGES_DIR, saved_filename)
     
     try:
-        async with aiofiles.open(file_path, 'wb') as f:
-            content = await image.read()
-            await f.write(content)
+        async with IO_SEM:
+            await asyncio.to_thread(write_upload_file, image.file, file_path)
+        FILE_INDEX[IMAGES_DIR][image_id] = saved_filename
         
         image_url = f"/static/images/{saved_filename}"
         
@@ -631,15 +1220,22 @@ async def upload_image(
         raise HTTPException(status_code=500, detail=f"Failed to upload image: {str(e)}")
 
 @app.get("/api/search")
-async def search_posts(q: str):
-    es = get_es_client()
+async def search_posts(
+    q: str,
+    limit: Optional[int] = Query(None, ge=1, le=ES_MAX_RESULT_WINDOW, description="최대 결과 수"),
+):
+    # 빈 검색어는 검색할 필요 없음
+    if not q.strip():
+        return {"posts": []}
+    es = await get_es_client()
     if not es:
-        posts = get_all_posts()
-        filtered_posts = [
-            post for post in posts 
-            if q.lower() in post.get("title", "").lower() or 
-               q.lower() in post.get("content", "").lower()
-        ]
+        q_lc = q.lower()
+        matches = (
+            post for post in await get_all_posts()
+            if q_lc in POSTS_LC[post["id"]][0] or q_lc in POSTS_LC[post["id"]][1]
+        )
+        # limit개를 찾으면 나머지 게시물은 검사하지 않음
+        filtered_posts = list(islice(matches, limit))
         return {"posts": [PostResponse(**post) for post in filtered_posts]}
     
     try:
@@ -651,9 +1247,17 @@ async def search_posts(q: str):
                 }
             }
         }
+        if limit is not None:
+            query["size"] = limit
         
-        result = es.search(index="posts", body=query)
+        result = await es.search(index="posts", body=query)
         posts = [hit["_source"] for hit in result["hits"]["hits"]]
+        # ES의 views는 색인 대기 중 반영되지 못한 증가분이 빠질 수 있으므로 캐시의 조회수로 덮어씀
+        await refresh_posts_cache()
+        for post in posts:
+            cached = POSTS_CACHE.get(post.get("id"))
+            if cached is not None:
+                post["views"] = cached["views"]
         return {"posts": [PostResponse(**post) for post in posts]}
     except Exception as e:
         print(f"Elasticsearch search error: {e}")